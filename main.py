@@ -1,17 +1,22 @@
 import sys
 import os
 import time
-import subprocess
-import shutil
-import tempfile
+import codecs
+import threading
+import signal
+import json
+import hashlib
+import re
+import functools
+import glob
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, Future, wait
 from typing import Callable
-import datetime
 
 from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QMessageBox, QWidget
+    QApplication, QMainWindow, QWidget
 )
-from PySide6.QtCore import QThread, Signal, Slot
-from numpy import true_divide
+from PySide6.QtCore import QProcess, QThread, QTimer, Signal
 
 # Assuming main_ui.py contains the converted UI class
 from main_ui import Ui_MainWindow
@@ -20,6 +25,68 @@ import serial
 # --- Configuration Constants ---
 ARDUINO_CLI = "arduino-cli"  # Ensure this is in your system's PATH
 BOARD_FQBN = "esp32:esp32:esp32"  # Fully Qualified Board Name (e.g., ESP32 Dev Module)
+BOARD_CORE = "esp32:esp32"  # Platform providing BOARD_FQBN
+CLI_GLOBAL_FLAGS = ["--no-color", "--log-level", "warn"]  # Keep arduino-cli output short and plain
+CLI_POLL_SECONDS = 0.1  # How often a running command's output is logged and a cancel request checked
+CLI_KILL_TIMEOUT_MS = 5000  # How long a cancelled command gets to exit before it is killed outright
+CLI_LINE_BREAK = re.compile(r"\r\n|\r|\n")  # arduino-cli progress bars end lines with '\r'
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mySensor")
+INSTALLED_LIBS_FILE = os.path.join(CACHE_DIR, "installed_libs.json")
+SKETCHES_DIR = os.path.join(CACHE_DIR, "sketches")  # Persistent sketch folders, one per sketch name
+BUILD_CACHE_DIR = os.path.join(CACHE_DIR, "build-cache")  # Shared core/library object cache
+BUILD_DIR = os.path.join(CACHE_DIR, "build")  # Per-sketch build output, reused between compiles
+SERIAL_PORTS_TTL = 2.0  # Seconds a serial port listing stays valid
+SERIAL_BATCH_LINES = 32  # Serial monitor lines sent to the GUI in one signal at most...
+SERIAL_BATCH_SECONDS = 0.02  # ...and the longest a line waits for others to join its batch
+MAX_LOG_LINES = 5000  # Oldest lines are dropped from the log and serial views beyond this
+LOG_FLUSH_INTERVAL_MS = 50  # Coalesce log lines into one widget update at most this often
+LOG_FLUSH_MAX_CHARS = 64 * 1024  # ...or as soon as this much text is waiting
+
+# Arduino libraries required by each sensor sketch (PubSubClient is always needed)
+LIBS = {
+    "DHT": ["DHT sensor library", "Adafruit Unified Sensor"],
+    "BME280": ["Adafruit BME280 Library", "Adafruit Unified Sensor"],
+    "MPU6050": ["Adafruit MPU6050", "Adafruit Unified Sensor", "Adafruit BusIO", "arduinoFFT"],
+    "HX711": ["HX711"],
+}
+COMMON_LIBS = ["PubSubClient"]
+
+
+@dataclass(frozen=True)
+class UploadSpec:
+    """Describes one sensor tab: which sketch it builds and which widgets feed it."""
+    sketch: str  # Sketch (and build folder) name
+    combo: str  # Name of the sensor type QComboBox in Ui_MainWindow
+    id_edit: str  # Name of the device ID QLineEdit in Ui_MainWindow
+    topics: tuple[str, ...]  # MQTT topics published by the sketch, prefixed with the device ID
+    templates: tuple[tuple[str, str], ...] = ()  # (sensor type, template) pairs, where they differ
+
+    def template_for(self, sensor_type: str) -> str:
+        """Returns the template name used for the given sensor type."""
+        return dict(self.templates).get(sensor_type, sensor_type)
+
+
+UPLOADS = {
+    "DHT": UploadSpec(sketch="MQTT_DHT", combo="comboBoxDHTType", id_edit="lineEditDeviceID_DHT",
+                      topics=("temperature", "humidity"),
+                      templates=(("DHT11", "DHT"), ("DHT22", "DHT"), ("RHT05", "DHT"), ("BME280", "BME280"))),
+    "VIB": UploadSpec(sketch="MQTT_VIB", combo="comboBoxVIBType", id_edit="lineEditDeviceID_VIB",
+                      topics=("freq_x", "freq_y", "freq_z", "rms_x", "rms_y", "rms_z")),
+    "WT": UploadSpec(sketch="MQTT_WT", combo="comboBoxWTType", id_edit="lineEditDeviceID_WT",
+                     topics=("weight",)),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _substitution_pattern(keys: tuple[str, ...]) -> re.Pattern:
+    """Compiles (once per set of template strings) a regex matching any of them."""
+    return re.compile("|".join(re.escape(key) for key in keys))
+
+
+def substitute_template(code: str, substitutions: dict[str, str]) -> str:
+    """Replaces every literal key of `substitutions` in `code` in a single pass."""
+    pattern = _substitution_pattern(tuple(substitutions))
+    return pattern.sub(lambda match: substitutions[match.group(0)], code)
 
 
 class ESP32Flasher:
@@ -27,6 +94,15 @@ class ESP32Flasher:
     Handles code generation, compilation, and uploading for ESP32 using Arduino CLI.
     """
 
+    # Libraries known to be installed, shared by all flasher instances
+    _installed_libs: set[str] = set()
+    # Digest of the code last written to each sketch folder, shared because the upload
+    # and pre-build flashers write the same sketch folders
+    _code_hashes: dict[str, str] = {}
+    # Whether _installed_libs has been checked against `arduino-cli lib list` this session
+    _libs_verified = False
+    # Whether BOARD_CORE has been confirmed installed in this session
+    _core_ready = False
     def __init__(self, log_callback: Callable[[str], None]):
         """
         Initializes the flasher with a callback function to send log messages to the GUI.
@@ -35,64 +111,225 @@ class ESP32Flasher:
             log_callback: A function (e.g., self.log_area.append) to output messages.
         """
         self.log_callback = log_callback
-        self.temp_dir = None
+        self.sketch_root = SKETCHES_DIR
+        os.makedirs(self.sketch_root, exist_ok=True)
+        # Set by cancel() to stop this flasher's running command; cleared by the caller per job
+        self.cancel_event = threading.Event()
+        ESP32Flasher._installed_libs.update(self._load_installed_libs())
 
     def _log(self, message: str):
         """Internal helper to call the provided log function."""
         self.log_callback(message)
 
+    def _start_cli_process(self, command: list, merge_stderr: bool = True) -> QProcess | None:
+        """
+        Starts arduino-cli with the given arguments, stdout and stderr merged unless
+        `merge_stderr` is False (e.g. when stdout must be parsed as JSON).
+        Returns the running QProcess, or None (after logging why) if it could not start.
+        """
+        process = QProcess()
+        if merge_stderr:
+            process.setProcessChannelMode(QProcess.ProcessChannelMode.MergedChannels)
+        else:
+            process.setProcessChannelMode(QProcess.ProcessChannelMode.SeparateChannels)
+        if os.name == 'posix':
+            # Own session, so cancelling also stops the compiler processes it spawns
+            process.setUnixProcessParameters(QProcess.UnixProcessFlag.CreateNewSession)
+        process.start(ARDUINO_CLI, CLI_GLOBAL_FLAGS + command)
+
+        if not process.waitForStarted(-1):
+            if process.error() == QProcess.ProcessError.FailedToStart:
+                self._log(f"ERROR: '{ARDUINO_CLI}' not found. Make sure Arduino CLI is installed and in your PATH.")
+            else:
+                self._log(f"An unexpected error occurred: {process.errorString()}")
+            return None
+        return process
+
     def _run_cli_command(self, command: list) -> bool:
         """
         Executes an Arduino CLI command and streams output to the log.
+        Blocks the calling (worker) thread, waking every CLI_POLL_SECONDS to log the
+        output buffered so far and to notice a cancel request.
         Returns True on success, False on failure.
         """
-        full_command = [ARDUINO_CLI] + command
+        full_command = [ARDUINO_CLI] + CLI_GLOBAL_FLAGS + command
         self._log(f"\n---> Executing: {" ".join(full_command)}")
-        
-        try:
-            # Use Popen to run the command and stream output in a non-blocking way
-            process = subprocess.Popen(
-                full_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT
-            )
-
-            line_buffer = bytearray()
-            while True:
-                byte = process.stdout.read(1)
-                if not byte:
-                    # End of stream
-                    if line_buffer:
-                        self._log(line_buffer.decode('utf-8', errors='replace').strip())
-                    break
-                
-                line_buffer.append(byte[0])
 
-                if byte == b'\n' or byte == b'\r':
-                    self._log(line_buffer.decode('utf-8', errors='replace').strip())
-                    line_buffer.clear()
+        if self.cancel_event.is_set():
+            self._log("COMMAND CANCELLED.")
+            return False
 
-            # Wait for the process to finish and check the return code
-            process.stdout.close()
-            return_code = process.wait()
+        process = self._start_cli_process(command)
+        if process is None:
+            return False
 
-            if return_code == 0:
-                self._log("COMMAND SUCCESSFUL.")
-                return True
-            else:
-                self._log(f"COMMAND FAILED with return code {return_code}.")
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        pending = ""
+
+        def log_output():
+            nonlocal pending
+            pending += decoder.decode(process.readAllStandardOutput().data())
+            *lines, pending = CLI_LINE_BREAK.split(pending)
+            for line in lines:
+                self._log(line.rstrip())
+
+        while process.state() != QProcess.ProcessState.NotRunning:
+            if self.cancel_event.is_set():
+                pid = process.processId()
+                if os.name == 'posix' and pid > 0:
+                    try:
+                        os.killpg(pid, signal.SIGTERM)
+                    except ProcessLookupError:
+                        pass  # Already gone
+                else:
+                    # terminate() only posts WM_CLOSE on Windows, which console programs ignore
+                    process.kill()
+                if not process.waitForFinished(CLI_KILL_TIMEOUT_MS):
+                    process.kill()
+                    process.waitForFinished(CLI_KILL_TIMEOUT_MS)
+                self._log("COMMAND CANCELLED.")
                 return False
 
-        except FileNotFoundError:
-            self._log(f"ERROR: '{ARDUINO_CLI}' not found. Make sure Arduino CLI is installed and in your PATH.")
+            # waitForFinished releases the GIL while it waits (waitForReadyRead does not,
+            # which would stall the GUI thread); QProcess keeps buffering output meanwhile
+            process.waitForFinished(int(CLI_POLL_SECONDS * 1000))
+            log_output()
+
+        # Pick up anything written just before the process exited
+        log_output()
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            self._log(pending.rstrip())
+
+        # Check how the process ended
+        if process.exitStatus() != QProcess.ExitStatus.NormalExit:
+            self._log("COMMAND FAILED: process crashed.")
             return False
-        except Exception as e:
-            self._log(f"An unexpected error occurred: {e}")
+
+        return_code = process.exitCode()
+        if return_code == 0:
+            self._log("COMMAND SUCCESSFUL.")
+            return True
+        else:
+            self._log(f"COMMAND FAILED with return code {return_code}.")
+            return False
+
+    def cancel(self):
+        """Terminates this flasher's running arduino-cli command and fails further ones until cleared."""
+        self.cancel_event.set()
+
+    def ensure_core_installed(self) -> bool:
+        """
+        Makes sure the board core is installed, updating the index and installing
+        it only when `arduino-cli core list` does not report it yet.
+        Returns True on success, False on failure.
+        """
+        if ESP32Flasher._core_ready:
+            return True
+
+        process = self._start_cli_process(["core", "list", "--format", "json"], merge_stderr=False)
+        if process is None:
+            return False
+        process.waitForFinished(-1)
+
+        # None means the listing could not be read, which is not the same as "missing"
+        installed = None
+        if process.exitStatus() == QProcess.ExitStatus.NormalExit and process.exitCode() == 0:
+            try:
+                output = process.readAllStandardOutput().data().decode('utf-8', errors='replace')
+                cores = json.loads(output or "[]")
+                # Newer arduino-cli versions wrap the list in {"platforms": [...]}
+                if isinstance(cores, dict):
+                    cores = cores.get("platforms") or []
+                installed = any(core.get("id") == BOARD_CORE for core in cores)
+            except (ValueError, AttributeError):
+                pass
+
+        if installed is None:
+            # Don't reinstall on a guess; compile will report a missing core anyway
+            self._log(f"Could not check whether {BOARD_CORE} is installed; skipping core install.")
+            return True
+
+        if not installed:
+            self._log(f"--- Installing board core {BOARD_CORE} ---")
+            if not (self._run_cli_command(["core", "update-index"])
+                    and self._run_cli_command(["core", "install", BOARD_CORE])):
+                return False
+
+        ESP32Flasher._core_ready = True
+        return True
+
+    @staticmethod
+    def _load_installed_libs() -> set[str]:
+        """Reads the persisted set of installed libraries, if any."""
+        try:
+            with open(INSTALLED_LIBS_FILE, 'r', encoding='utf-8') as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    def _save_installed_libs(self):
+        """Persists the set of installed libraries for the next run."""
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(INSTALLED_LIBS_FILE, 'w', encoding='utf-8') as f:
+                json.dump(sorted(ESP32Flasher._installed_libs), f)
+        except OSError as e:
+            self._log(f"Could not save library cache: {e}")
+
+    def _verify_installed_libs(self):
+        """
+        Replaces the persisted library set with what `arduino-cli lib list` reports,
+        so libraries removed outside the application are installed again.
+        Keeps the persisted set if the listing cannot be read.
+        """
+        process = self._start_cli_process(["lib", "list", "--format", "json"], merge_stderr=False)
+        if process is None:
+            return
+        process.waitForFinished(-1)
+        if process.exitStatus() != QProcess.ExitStatus.NormalExit or process.exitCode() != 0:
+            return
+
+        try:
+            output = process.readAllStandardOutput().data().decode('utf-8', errors='replace')
+            libs = json.loads(output or "[]")
+            # Newer arduino-cli versions wrap the list in {"installed_libraries": [...]}
+            if isinstance(libs, dict):
+                libs = libs.get("installed_libraries") or []
+            installed = {entry["library"]["name"] for entry in libs}
+        except (ValueError, KeyError, TypeError):
+            return
+
+        ESP32Flasher._installed_libs = installed
+        ESP32Flasher._libs_verified = True
+        self._save_installed_libs()
+
+    def install_libraries(self, libraries: list[str]) -> bool:
+        """
+        Installs the given Arduino libraries with a single arduino-cli call,
+        skipping any that are already known to be installed.
+        Returns True on success, False on failure.
+        """
+        if not ESP32Flasher._libs_verified:
+            self._verify_installed_libs()
+
+        missing = [lib for lib in dict.fromkeys(libraries) if lib not in ESP32Flasher._installed_libs]
+        if not missing:
+            self._log("All required libraries are already installed.")
+            return True
+
+        if not self._run_cli_command(["lib", "install"] + missing):
             return False
 
+        ESP32Flasher._installed_libs.update(missing)
+        self._save_installed_libs()
+        return True
+
     def generate_and_prepare_code(self, sketch_name: str, code_content: str) -> bool:
         """
-        Generates the code and writes it to a temporary directory structure.
+        Generates the code and writes it to a persistent sketch directory.
+        The .ino file is only rewritten when its content changes, so that
+        arduino-cli can reuse the previous build.
         
         Args:
             sketch_name: The name of the sketch (must match the folder name, e.g., 'BlinkSketch').
@@ -101,81 +338,105 @@ class ESP32Flasher:
         Returns:
             True if successful, False otherwise.
         """
-        # Cleanup any previous temporary directory
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
-            
-        # 1. Create a temporary directory for the sketch
         try:
-            self.temp_dir = tempfile.mkdtemp(prefix="esp32_gui_")
-            sketch_folder = os.path.join(self.temp_dir, sketch_name)
-            os.makedirs(sketch_folder)
+            sketch_folder = os.path.join(self.sketch_root, sketch_name)
             sketch_file_path = os.path.join(sketch_folder, f"{sketch_name}.ino")
-            
-            # 2. Write the code content to the .ino file
-            with open(sketch_file_path, 'w') as f:
-                f.write(code_content)
+            hash_file_path = os.path.join(sketch_folder, ".code_hash")
+
+            code_bytes = code_content.encode('utf-8')
+            code_hash = hashlib.blake2b(code_bytes).hexdigest()
+            previous_hash = ESP32Flasher._code_hashes.get(sketch_name)
+            if previous_hash is None:
+                # First use of this sketch in this session: consult what is on disk
+                if os.path.exists(hash_file_path):
+                    with open(hash_file_path, 'r') as f:
+                        previous_hash = f.read().strip()
+
+            # The file itself is checked too, in case it was removed during the session
+            if code_hash == previous_hash and os.path.isfile(sketch_file_path):
+                ESP32Flasher._code_hashes[sketch_name] = code_hash
+                self._log(f"Code unchanged, reusing: {sketch_file_path}")
+                return True
+
+            # Write the code content to the .ino file, then record its hash
+            os.makedirs(sketch_folder, exist_ok=True)
+            # Binary mode skips TextIOWrapper's encoding and newline translation
+            with open(sketch_file_path, 'wb') as f:
+                f.write(code_bytes)
+            with open(hash_file_path, 'w') as f:
+                f.write(code_hash)
+            ESP32Flasher._code_hashes[sketch_name] = code_hash
                 
             self._log(f"Code generated and saved to: {sketch_file_path}")
             return True
             
         except Exception as e:
-            self._log(f"Error preparing temporary files: {e}")
+            self._log(f"Error preparing sketch files: {e}")
             return False
 
+    def _prepared_sketch_path(self, sketch_name: str) -> str | None:
+        """Returns the sketch folder if its .ino file exists, otherwise logs an error and returns None."""
+        sketch_path = os.path.join(self.sketch_root, sketch_name)
+        if not os.path.isfile(os.path.join(sketch_path, f"{sketch_name}.ino")):
+            self._log("ERROR: Code not prepared. Call generate_and_prepare_code first.")
+            return None
+        return sketch_path
 
     def compile_code(self, sketch_name: str) -> bool:
-        """Compiles the sketch located in the temporary directory."""
-        if not self.temp_dir:
-            self._log("ERROR: Code not prepared. Call generate_and_prepare_code first.")
+        """Compiles the sketch, reusing the build output and core cache from previous runs."""
+        sketch_path = self._prepared_sketch_path(sketch_name)
+        if not sketch_path:
             return False
-            
-        sketch_path = os.path.join(self.temp_dir, sketch_name)
         
         self._log("\n--- Starting Compilation ---")
         command = [
             "compile",
             "--fqbn", BOARD_FQBN,
+            "--build-cache-path", BUILD_CACHE_DIR,
+            "--build-path", os.path.join(BUILD_DIR, sketch_name),
+            "--jobs", str(os.cpu_count() or 1),
             sketch_path
         ]
         return self._run_cli_command(command)
 
     def upload_code(self, sketch_name: str, port: str) -> bool:
         """Uploads the compiled sketch to the specified serial port."""
-        if not self.temp_dir:
-            self._log("ERROR: Code not prepared. Call generate_and_prepare_code first.")
+        sketch_path = self._prepared_sketch_path(sketch_name)
+        if not sketch_path:
             return False
-            
-        sketch_path = os.path.join(self.temp_dir, sketch_name)
         
         self._log(f"\n--- Starting Upload to Port: {port} ---")
         command = [
             "upload",
             "--fqbn", BOARD_FQBN,
             "-p", port,
+            "--input-dir", os.path.join(BUILD_DIR, sketch_name),
             sketch_path
         ]
         return self._run_cli_command(command)
-        
-    def cleanup(self):
-        """Removes the temporary directory and all generated files."""
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            try:
-                shutil.rmtree(self.temp_dir)
-                self._log(f"\nCleaned up temporary directory: {self.temp_dir}")
-            except Exception as e:
-                self._log(f"Error during cleanup: {e}")
                 
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _list_serial_ports(ttl_bucket: int) -> tuple[str, ...]:
+        """Enumerates serial ports; cached per SERIAL_PORTS_TTL time bucket."""
+        import serial.tools.list_ports
+        return tuple(port.device for port in serial.tools.list_ports.comports())
+
+    @staticmethod
+    def invalidate_serial_ports():
+        """Drops the cached port listing, e.g. after a device was plugged in or removed."""
+        ESP32Flasher._list_serial_ports.cache_clear()
+
     @staticmethod
     def get_serial_ports() -> list[str]:
         """
         Uses the 'pyserial' library to list available serial ports.
+        Results are cached for SERIAL_PORTS_TTL seconds since enumeration is slow.
         NOTE: You must install the pyserial library (`pip install pyserial`).
         """
         try:
-            import serial.tools.list_ports
-            ports = [port.device for port in serial.tools.list_ports.comports()]
-            return ports
+            ttl_bucket = int(time.monotonic() // SERIAL_PORTS_TTL)
+            return list(ESP32Flasher._list_serial_ports(ttl_bucket))
         except ImportError:
             # Fallback for systems without pyserial installed
             return ["/dev/ttyUSB0 (Install pyserial)", "COM3 (Install pyserial)"]
@@ -186,6 +447,8 @@ class FlasherWorker(QThread):
     log_signal = Signal(str)
     finished_signal = Signal()
     sensorType = ""
+    install_future: Future | None = None  # Background core/library install
+    prebuild_futures: list[Future] = []  # Background pre-builds still running (see stop_prebuilds)
 
     def __init__(self, flasher, sketch_name, target_port, modified_code):
         super().__init__()
@@ -196,58 +459,29 @@ class FlasherWorker(QThread):
 
     def run(self):
         try:
-            # 1. Install libraries
+            # 0. Let the background install finish, and whichever pre-build was running
+            #    (MainWindow.stop_prebuilds dropped the queued ones and cancels the others)
+            pending = [future for future in [self.install_future] + self.prebuild_futures
+                       if future is not None and not future.done()]
+            if pending:
+                self.log_signal.emit("--- Waiting for background pre-build ---")
+                while wait(pending, timeout=CLI_POLL_SECONDS).not_done:
+                    if self.flasher.cancel_event.is_set():
+                        self.log_signal.emit("\n*** CANCELLED ***")
+                        return
+
+            # 1. Install the board core (if needed) and libraries
+            if not self.flasher.ensure_core_installed():
+                self.log_signal.emit("Failed to install the board core.")
+                return
+
             self.log_signal.emit("--- Installing libraries ---")
 
-            if self.sensorType == "DHT":
-                if not self.flasher._run_cli_command(["lib", "install", "DHT sensor library"]):
-                    self.log_signal.emit("Failed to install DHT sensor library.")
-                    self.finished_signal.emit()
-                    return
-                if not self.flasher._run_cli_command(["lib", "install", "Adafruit Unified Sensor"]):
-                    self.log_signal.emit("Failed to install Adafruit Unified Sensor library.")
-                    self.finished_signal.emit()
-                    return
-            
-            elif self.sensorType == "BME280":
-                if not self.flasher._run_cli_command(["lib", "install", "Adafruit BME280 Library"]):
-                    self.log_signal.emit("Failed to install Adafruit BME280 Library.")
-                    self.finished_signal.emit()
-                    return
-                if not self.flasher._run_cli_command(["lib", "install", "Adafruit Unified Sensor"]):
-                    self.log_signal.emit("Failed to install Adafruit Unified Sensor library.")
-                    self.finished_signal.emit()
-                    return
-            
-            elif self.sensorType == "MPU6050":
-                if not self.flasher._run_cli_command(["lib", "install", "Adafruit MPU6050"]):
-                    self.log_signal.emit("Failed to install Adafruit MPU6050 Library.")
-                    self.finished_signal.emit()
-                    return
-                if not self.flasher._run_cli_command(["lib", "install", "Adafruit Unified Sensor"]):
-                    self.log_signal.emit("Failed to install Adafruit Unified Sensor library.")
-                    self.finished_signal.emit()
-                    return
-                if not self.flasher._run_cli_command(["lib", "install", "Adafruit BusIO"]):
-                    self.log_signal.emit("Failed to install Adafruit BusIO library.")
-                    self.finished_signal.emit()
-                    return
-                if not self.flasher._run_cli_command(["lib", "install", "arduinoFFT"]):
-                    self.log_signal.emit("Failed to install Adafruit BusIO library.")
-                    self.finished_signal.emit()
-                    return
-                
-            elif self.sensorType == "HX711":
-                if not self.flasher._run_cli_command(["lib", "install", "HX711"]):
-                    self.log_signal.emit("Failed to install HX711 Library.")
-                    self.finished_signal.emit()
-                    return
-
-            if not self.flasher._run_cli_command(["lib", "install", "PubSubClient"]):
-                self.log_signal.emit("Failed to install PubSubClient library.")
-                self.finished_signal.emit()
+            libraries = LIBS.get(self.sensorType, []) + COMMON_LIBS
+            if not self.flasher.install_libraries(libraries):
+                self.log_signal.emit("Failed to install libraries.")
                 return
-            
+
             self.log_signal.emit("--- Libraries installed ---")
 
             # A. Get available ports for the GUI ComboBox
@@ -272,14 +506,20 @@ class FlasherWorker(QThread):
                     self.log_signal.emit("\n*** FAILED: COMPILATION FAILED ***")
                     
         finally:
-            # E. Cleanup the temporary files
-            self.flasher.cleanup()
+            # The sketch and build directories are kept for incremental builds
             self.finished_signal.emit()
 
+class PortScanner(QThread):
+    """Lists serial ports off the GUI thread and reports them through ports_found."""
+    ports_found = Signal(list)
+
+    def run(self):
+        self.ports_found.emit(ESP32Flasher.get_serial_ports())
+
 class serial_monitor(QThread):
     port = ""
     baudrate = 115200
-    inComming = Signal(bytearray)
+    inComming = Signal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -293,16 +533,32 @@ class serial_monitor(QThread):
 
         self.serial_device.port = self.port
         self.serial_device.baudrate = self.baudrate
+        # Block in readline() for at most this long so stop() is noticed promptly
+        self.serial_device.timeout = 0.2
         self.serial_device.open()
         self._running = True
 
+        # Lines are decoded here and sent in batches while the device is streaming;
+        # a batch is flushed as soon as no more input is waiting.
+        batch = []
+        batch_started = 0.0
         while self._running:
-            while (self.serial_device.in_waiting):
-                inLine = self.serial_device.readline()
-                self.inComming.emit(inLine)
-
-            time.sleep(0.1)
-        
+            inLine = self.serial_device.readline()
+            if not inLine:
+                continue
+
+            if not batch:
+                batch_started = time.monotonic()
+            batch.append(inLine.decode('utf-8', errors='replace').strip())
+
+            if (len(batch) >= SERIAL_BATCH_LINES
+                    or time.monotonic() - batch_started >= SERIAL_BATCH_SECONDS
+                    or not self.serial_device.in_waiting):
+                self.inComming.emit("\n".join(batch))
+                batch.clear()
+
+        if batch:
+            self.inComming.emit("\n".join(batch))
         self.serial_device.close()
 
     def stop(self):
@@ -311,6 +567,9 @@ class serial_monitor(QThread):
         
 # --- Main PySide6 Application Window ---
 class MainWindow(QMainWindow, Ui_MainWindow):
+    log_message = Signal(str)
+    ports_changed = Signal()
+
     def __init__(self):
         super().__init__()
         self.ui = Ui_MainWindow()
@@ -318,9 +577,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.setWindowTitle("ESP32 GUI Programmer")
 
-        ports = ESP32Flasher.get_serial_ports()
-        self.ui.comboBoxPorts.clear()
-        self.ui.comboBoxPorts.addItems(ports)
+        # Bound both views so appends stay cheap however long the session runs
+        self.ui.plainTextEditLogOutput.document().setMaximumBlockCount(MAX_LOG_LINES)
+        self.ui.textBrowserSerialMonitor.document().setMaximumBlockCount(MAX_LOG_LINES)
+
+        self.portScanner = PortScanner(parent=self)
+        self.portScanner.ports_found.connect(self.update_port_list)
+        self.portScanner.finished.connect(self.on_port_scan_finished)
+        self._port_rescan_pending = False
+        self.portScanner.start()
+        self.ports_changed.connect(self.refresh_ports)
+        self.deviceObserver = self.start_device_observer()
 
         QWidget.setTabOrder(self.ui.comboBoxPorts, self.ui.lineEditSSID)
         QWidget.setTabOrder(self.ui.lineEditSSID, self.ui.lineEditPassword)
@@ -332,19 +599,126 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.serialMonitor.inComming.connect(self.show_serial_monitor)
         self.ui.pushButtonStartSerialMonitor.clicked.connect(self.toggle_serial_monitor)
 
-        self.ui.pushButtonUpload_DHT.clicked.connect(self.start_upload_DHT)
-        self.ui.pushButtonUpload_VIB.clicked.connect(self.start_upload_VIB)
-        self.ui.pushButtonUpload_WT.clicked.connect(self.start_upload_WT)
+        self.ui.pushButtonUpload_DHT.clicked.connect(functools.partial(self._start_upload, UPLOADS["DHT"]))
+        self.ui.pushButtonUpload_VIB.clicked.connect(functools.partial(self._start_upload, UPLOADS["VIB"]))
+        self.ui.pushButtonUpload_WT.clicked.connect(functools.partial(self._start_upload, UPLOADS["WT"]))
+
+        self.ui.pushButtonAutoID_DHT.clicked.connect(functools.partial(self._auto_id, UPLOADS["DHT"]))
+        self.ui.pushButtonAutoID_VIB.clicked.connect(functools.partial(self._auto_id, UPLOADS["VIB"]))
+        self.ui.pushButtonAutoID_WT.clicked.connect(functools.partial(self._auto_id, UPLOADS["WT"]))
 
-        self.ui.pushButtonAutoID_DHT.clicked.connect(self.autoID_DHT)
-        self.ui.pushButtonAutoID_VIB.clicked.connect(self.autoID_VIB)
-        self.ui.pushButtonAutoID_WT.clicked.connect(self.autoID_WT)
+        # Log lines may come from worker threads; the signal queues them onto the GUI thread
+        self.log_message.connect(self.gui_log_display)
+        self._log_buffer: list[str] = []
+        self._log_buffer_size = 0
+        self._log_flush_timer = QTimer(self)
+        self._log_flush_timer.setSingleShot(True)
+        self._log_flush_timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self._log_flush_timer.timeout.connect(self.flush_log_buffer)
 
-        self.flasher = ESP32Flasher(log_callback=self.gui_log_display)
+        self.flasher = ESP32Flasher(log_callback=self.log_message.emit)
         self.worker = None
+        self.ui.pushButtonCancelUpload.clicked.connect(self.cancel_upload)
+
+        self._templates = self.load_templates("codes")
+
+        # A single worker runs the pre-builds one after another: each compile already
+        # uses every core (--jobs) and they all share the build cache
+        self.compile_pool = ThreadPoolExecutor(max_workers=1)
+        self.install_future, self.prebuild_futures = self.start_prebuilds()
 
         self.ui.actionExit.triggered.connect(self.close)
 
+    def start_device_observer(self):
+        """
+        On Linux with pyudev installed, watches for tty devices being added or
+        removed so the port list is refreshed only when something changes.
+        """
+        try:
+            import pyudev
+            context = pyudev.Context()
+            monitor = pyudev.Monitor.from_netlink(context)
+            monitor.filter_by(subsystem='tty')
+            observer = pyudev.MonitorObserver(monitor, callback=lambda device: self.ports_changed.emit())
+            observer.start()
+            return observer
+        except Exception:
+            # pyudev is optional (and Linux only)
+            return None
+
+    def refresh_ports(self):
+        ESP32Flasher.invalidate_serial_ports()
+        if self.portScanner.isRunning():
+            # The running scan may already hold the old list; scan again once it ends
+            self._port_rescan_pending = True
+        else:
+            self.portScanner.start()
+
+    def on_port_scan_finished(self):
+        if self._port_rescan_pending:
+            self._port_rescan_pending = False
+            ESP32Flasher.invalidate_serial_ports()
+            self.portScanner.start()
+
+    def update_port_list(self, ports):
+        current_port = self.ui.comboBoxPorts.currentText()
+        self.ui.comboBoxPorts.clear()
+        self.ui.comboBoxPorts.addItems(ports)
+        if current_port in ports:
+            self.ui.comboBoxPorts.setCurrentText(current_port)
+
+    def start_prebuilds(self) -> tuple[Future, dict[str, Future]]:
+        """
+        Installs the board core and libraries if needed, then compiles each tab's
+        currently selected template in the background, into the same sketch and build
+        folders its upload uses. The first upload then only recompiles the sketch itself:
+        library objects are reused from the build folder and the core from the build cache.
+        Returns the install future and the pre-build futures keyed by sketch name.
+        """
+        # Pre-build jobs run one at a time, so they share one flasher (cancelled on close)
+        self.prebuild_flasher = ESP32Flasher(log_callback=self.log_prebuild)
+        flasher = self.prebuild_flasher
+
+        def install_all():
+            if not flasher.ensure_core_installed():
+                return False
+            libraries = [lib for libs in LIBS.values() for lib in libs] + COMMON_LIBS
+            return flasher.install_libraries(libraries)
+
+        def prebuild(spec, fstype, install_future):
+            if not install_future.result():
+                return False
+            code = self._templates.get(f"mqtt_{fstype}")
+            if code is None:
+                return False
+            return flasher.generate_and_prepare_code(spec.sketch, code) and flasher.compile_code(spec.sketch)
+
+        install_future = self.compile_pool.submit(install_all)
+        futures = {}
+        for spec in UPLOADS.values():
+            fstype = spec.template_for(getattr(self.ui, spec.combo).currentText())
+            futures[spec.sketch] = self.compile_pool.submit(prebuild, spec, fstype, install_future)
+        return install_future, futures
+
+    def log_prebuild(self, message: str):
+        """Logs a background pre-build message, tagged so it is not mistaken for upload output."""
+        self.log_message.emit("\n".join(f"[pre-build] {line}" if line else line
+                                         for line in message.split("\n")))
+
+    def stop_prebuilds(self, key: str) -> list[Future]:
+        """
+        Keeps background pre-builds from competing with an upload for the CPU and build
+        cache: queued ones are dropped, and a running one is cancelled unless it is the
+        pre-build for `key`. Returns the pre-builds still running, for the upload to wait on.
+        """
+        running = []
+        for prebuild_key, future in self.prebuild_futures.items():
+            if not future.cancel() and future.running():
+                running.append(future)
+                if prebuild_key != key:
+                    self.prebuild_flasher.cancel()
+        return running
+
     def toggle_serial_monitor(self):
         if self.serialMonitor._running:
             self.serialMonitor.stop()
@@ -356,37 +730,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.serialMonitor.start()
             # self.ui.pushButtonStartSerialMonitor.setText("모니터 중단")
 
-    def show_serial_monitor(self, inMessage:bytearray):
-        message = inMessage.decode('utf-8', errors='replace').strip()
+    def show_serial_monitor(self, message:str):
         self.ui.textBrowserSerialMonitor.append(message)
         self.ui.textBrowserSerialMonitor.verticalScrollBar().setValue(self.ui.textBrowserSerialMonitor.verticalScrollBar().maximum())
 
-    def autoID_DHT(self):
-        stype = self.ui.comboBoxDHTType.currentText()
-        current_time = datetime.datetime.now()
-        log_format = current_time.strftime("%Y%m%d%H%M%S")
-
-        autoID = f"KIOT/ESP32/{stype}/{log_format}"
-
-        self.ui.lineEditDeviceID_DHT.setText(autoID)
-
-    def autoID_VIB(self):
-        stype = self.ui.comboBoxVIBType.currentText()
-        current_time = datetime.datetime.now()
-        log_format = current_time.strftime("%Y%m%d%H%M%S")
-
-        autoID = f"KIOT/ESP32/{stype}/{log_format}"
+    def _auto_id(self, spec: UploadSpec):
+        stype = getattr(self.ui, spec.combo).currentText()
+        autoID = f"KIOT/ESP32/{stype}/{time.strftime('%Y%m%d%H%M%S')}"
 
-        self.ui.lineEditDeviceID_VIB.setText(autoID)
-
-    def autoID_WT(self):
-        stype = self.ui.comboBoxWTType.currentText()
-        current_time = datetime.datetime.now()
-        log_format = current_time.strftime("%Y%m%d%H%M%S")
-
-        autoID = f"KIOT/ESP32/{stype}/{log_format}"
-
-        self.ui.lineEditDeviceID_WT.setText(autoID)
+        getattr(self.ui, spec.id_edit).setText(autoID)
 
     def disable_action_buttons(self, enabled=False):
         self.ui.pushButtonUpload_DHT.setEnabled(enabled)
@@ -396,143 +748,68 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.ui.pushButtonAutoID_DHT.setEnabled(enabled)
         self.ui.pushButtonAutoID_VIB.setEnabled(enabled)
         self.ui.pushButtonAutoID_WT.setEnabled(enabled)
+        # Cancel is only available while an upload is running
+        self.ui.pushButtonCancelUpload.setEnabled(not enabled)
 
-    def start_upload_DHT(self):
-        if self.serialMonitor._running:
-            self.serialMonitor.stop()
-            self.serialMonitor.wait()
-
-
-        TARGET_PORT = self.ui.comboBoxPorts.currentText()
-
-        # 1. Define a simple code to generate (user input in your GUI)
-        SKETCH_NAME = "MQTT_DHT"
-        stype = self.ui.comboBoxDHTType.currentText()
-        if stype == "DHT11" or stype == "DHT22" or stype == "RHT05":
-            fstype = "DHT"
-        else:
-            fstype = "BME280"
+    def cancel_upload(self):
+        if self.worker and self.worker.isRunning():
+            self.gui_log_display("\n--- Cancelling upload ---")
+            self.flasher.cancel()
 
-        EXAMPLE_CODE = self.read_code_file(f"codes/mqtt_{fstype}.ino")
-
-        ssid = self.ui.lineEditSSID.text()
-        password = self.ui.lineEditPassword.text()
-        serverAddress = self.ui.lineEditServerAddress.text()
-        portNumber = self.ui.lineEditServerPortNumber.text()
-        deviceID = self.ui.lineEditDeviceID_DHT.text()
-
-        modified_code = EXAMPLE_CODE.replace('const char* ssid = "MYSSID";', f'const char* ssid = "{ssid}";')
-        modified_code = modified_code.replace('const char* password = "MYPASS";', f'const char* password = "{password}";')
-        modified_code = modified_code.replace('const char* mqtt_server = "MYMQTTSERVER";', f'const char* mqtt_server = "{serverAddress}";')
-        modified_code = modified_code.replace('  client.setServer(mqtt_server, portNumber);', f'  client.setServer(mqtt_server, {portNumber});')
-        modified_code = modified_code.replace('    if (client.connect("esp32_htj"))', f'    if (client.connect("{deviceID}"))')
-        modified_code = modified_code.replace('      client.subscribe("esp32_htj/output");', f'      client.subscribe("{deviceID}/output");')
-
-        modified_code = modified_code.replace('    client.publish("esp32_htj/temperature", tempString);', f'    client.publish("{deviceID}/temperature", tempString);')
-        modified_code = modified_code.replace('    client.publish("esp32_htj/humidity", humString);', f'    client.publish("{deviceID}/humidity", humString);')
-
-        modified_code = modified_code.replace('  Serial.print("device ID: "); Serial.println("myID");', f'  Serial.print("device ID: "); Serial.println("{deviceID}");')
-        
-
-        # print(modified_code)
-        # return
-
-        self.worker = FlasherWorker(self.flasher, SKETCH_NAME, TARGET_PORT, modified_code)
-        self.worker.sensorType = fstype
-        self.worker.log_signal.connect(self.gui_log_display)
-        self.worker.finished_signal.connect(self.on_upload_finished)
-        self.worker.start()
-
-        self.disable_action_buttons(enabled=False)
-
-    def start_upload_VIB(self):
+    def _start_upload(self, spec: UploadSpec):
         if self.serialMonitor._running:
             self.serialMonitor.stop()
             self.serialMonitor.wait()
 
-
         TARGET_PORT = self.ui.comboBoxPorts.currentText()
 
-        # 1. Define a simple code to generate (user input in your GUI)
-        SKETCH_NAME = "MQTT_VIB"
-        fstype = self.ui.comboBoxVIBType.currentText()
-        EXAMPLE_CODE = self.read_code_file(f"codes/mqtt_{fstype}.ino")
+        # 1. Pick the template for the selected sensor and fill in the user's settings
+        stype = getattr(self.ui, spec.combo).currentText()
+        fstype = spec.template_for(stype)
+        EXAMPLE_CODE = self._templates[f"mqtt_{fstype}"]
 
         ssid = self.ui.lineEditSSID.text()
         password = self.ui.lineEditPassword.text()
         serverAddress = self.ui.lineEditServerAddress.text()
         portNumber = self.ui.lineEditServerPortNumber.text()
-        deviceID = self.ui.lineEditDeviceID_VIB.text()
-
-        modified_code = EXAMPLE_CODE.replace('const char* ssid = "MYSSID";', f'const char* ssid = "{ssid}";')
-        modified_code = modified_code.replace('const char* password = "MYPASS";', f'const char* password = "{password}";')
-        modified_code = modified_code.replace('const char* mqtt_server = "MYMQTTSERVER";', f'const char* mqtt_server = "{serverAddress}";')
-        modified_code = modified_code.replace('  client.setServer(mqtt_server, portNumber);', f'  client.setServer(mqtt_server, {portNumber});')
-        modified_code = modified_code.replace('    if (client.connect("esp32_htj"))', f'    if (client.connect("{deviceID}"))')
-        modified_code = modified_code.replace('      client.subscribe("esp32_htj/output");', f'      client.subscribe("{deviceID}/output");')
-
-        modified_code = modified_code.replace('    client.publish("esp32_htj/freq_x", tempString);', f'    client.publish("{deviceID}/freq_x", tempString);')
-        modified_code = modified_code.replace('    client.publish("esp32_htj/freq_y", tempString);', f'    client.publish("{deviceID}/freq_y", tempString);')
-        modified_code = modified_code.replace('    client.publish("esp32_htj/freq_z", tempString);', f'    client.publish("{deviceID}/freq_z", tempString);')
-        modified_code = modified_code.replace('    client.publish("esp32_htj/rms_x", tempString);', f'    client.publish("{deviceID}/rms_x", tempString);')
-        modified_code = modified_code.replace('    client.publish("esp32_htj/rms_y", tempString);', f'    client.publish("{deviceID}/rms_y", tempString);')
-        modified_code = modified_code.replace('    client.publish("esp32_htj/rms_z", tempString);', f'    client.publish("{deviceID}/rms_z", tempString);')
-
-        modified_code = modified_code.replace('  Serial.print("device ID: "); Serial.println("myID");', f'  Serial.print("device ID: "); Serial.println("{deviceID}");')
-        
-
-        # print(modified_code)
-        # return
-
-        self.worker = FlasherWorker(self.flasher, SKETCH_NAME, TARGET_PORT, modified_code)
+        deviceID = getattr(self.ui, spec.id_edit).text()
+
+        substitutions = {
+            'const char* ssid = "MYSSID";': f'const char* ssid = "{ssid}";',
+            'const char* password = "MYPASS";': f'const char* password = "{password}";',
+            'const char* mqtt_server = "MYMQTTSERVER";': f'const char* mqtt_server = "{serverAddress}";',
+            'client.setServer(mqtt_server, portNumber);': f'client.setServer(mqtt_server, {portNumber});',
+            'client.connect("esp32_htj")': f'client.connect("{deviceID}")',
+            'client.subscribe("esp32_htj/output");': f'client.subscribe("{deviceID}/output");',
+            'Serial.print("device ID: "); Serial.println("myID");': f'Serial.print("device ID: "); Serial.println("{deviceID}");',
+        }
+        for topic in spec.topics:
+            substitutions[f'client.publish("esp32_htj/{topic}",'] = f'client.publish("{deviceID}/{topic}",'
+        modified_code = substitute_template(EXAMPLE_CODE, substitutions)
+
+        self.worker = FlasherWorker(self.flasher, spec.sketch, TARGET_PORT, modified_code)
         self.worker.sensorType = fstype
+        self.worker.install_future = self.install_future
+        self.worker.prebuild_futures = self.stop_prebuilds(spec.sketch)
         self.worker.log_signal.connect(self.gui_log_display)
         self.worker.finished_signal.connect(self.on_upload_finished)
+        # Cleared before start() so a Cancel clicked before run() begins is not lost
+        self.flasher.cancel_event.clear()
         self.worker.start()
 
         self.disable_action_buttons(enabled=False)
 
-    def start_upload_WT(self):
-        if self.serialMonitor._running:
-            self.serialMonitor.stop()
-            self.serialMonitor.wait()
-
-
-        TARGET_PORT = self.ui.comboBoxPorts.currentText()
-
-        # 1. Define a simple code to generate (user input in your GUI)
-        SKETCH_NAME = "MQTT_WT"
-        fstype = self.ui.comboBoxWTType.currentText()
-        EXAMPLE_CODE = self.read_code_file(f"codes/mqtt_{fstype}.ino")
-
-        ssid = self.ui.lineEditSSID.text()
-        password = self.ui.lineEditPassword.text()
-        serverAddress = self.ui.lineEditServerAddress.text()
-        portNumber = self.ui.lineEditServerPortNumber.text()
-        deviceID = self.ui.lineEditDeviceID_WT.text()
-
-        modified_code = EXAMPLE_CODE.replace('const char* ssid = "MYSSID";', f'const char* ssid = "{ssid}";')
-        modified_code = modified_code.replace('const char* password = "MYPASS";', f'const char* password = "{password}";')
-        modified_code = modified_code.replace('const char* mqtt_server = "MYMQTTSERVER";', f'const char* mqtt_server = "{serverAddress}";')
-        modified_code = modified_code.replace('  client.setServer(mqtt_server, portNumber);', f'  client.setServer(mqtt_server, {portNumber});')
-        modified_code = modified_code.replace('    if (client.connect("esp32_htj"))', f'    if (client.connect("{deviceID}"))')
-        modified_code = modified_code.replace('      client.subscribe("esp32_htj/output");', f'      client.subscribe("{deviceID}/output");')
-
-        modified_code = modified_code.replace('    client.publish("esp32_htj/weight", tempString);', f'    client.publish("{deviceID}/weight", tempString);')
-
-        modified_code = modified_code.replace('    Serial.print("device ID: "); Serial.println("myID");', f'    Serial.print("device ID: "); Serial.println("{deviceID}");')
-        
-
-        # print(modified_code)
-        # return
-
-        self.worker = FlasherWorker(self.flasher, SKETCH_NAME, TARGET_PORT, modified_code)
-        self.worker.sensorType = fstype
-        self.worker.log_signal.connect(self.gui_log_display)
-        self.worker.finished_signal.connect(self.on_upload_finished)
-        self.worker.start()
-
-        self.disable_action_buttons(enabled=False)
+    def load_templates(self, folder: str) -> dict[str, str]:
+        """
+        Reads every sketch template in `folder` once, keyed by file name without extension
+        (e.g. 'mqtt_DHT' for 'codes/mqtt_DHT.ino').
+        """
+        templates = {}
+        for file_path in glob.glob(os.path.join(folder, "*.ino")):
+            content = self.read_code_file(file_path)
+            if content is not None:
+                templates[os.path.splitext(os.path.basename(file_path))[0]] = content
+        return templates
 
     def read_code_file(self, file_path):
         """
@@ -569,11 +846,41 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.serialMonitor.start()
 
     def gui_log_display(self, message):
+        # Each line still arrives as its own (queued) call; only the widget update is batched
         print(message)
-        self.ui.textBrowserLogOutput.append(message)
-        self.ui.textBrowserLogOutput.verticalScrollBar().setValue(self.ui.textBrowserLogOutput.verticalScrollBar().maximum())
+        self._log_buffer.append(message)
+        self._log_buffer_size += len(message)
+        if self._log_buffer_size >= LOG_FLUSH_MAX_CHARS:
+            self.flush_log_buffer()
+        elif not self._log_flush_timer.isActive():
+            self._log_flush_timer.start()
+
+    def flush_log_buffer(self):
+        """Appends all buffered log lines to the log view in a single update."""
+        self._log_flush_timer.stop()
+        if not self._log_buffer:
+            return
+
+        block = "\n".join(self._log_buffer)
+        self._log_buffer.clear()
+        self._log_buffer_size = 0
+
+        log_output = self.ui.plainTextEditLogOutput
+        log_output.appendPlainText(block)
+        log_output.verticalScrollBar().setValue(log_output.verticalScrollBar().maximum())
 
     def closeEvent(self, event):
+        # Cancelling kills the running arduino-cli commands, so the waits below are short
+        self.flasher.cancel()
+        self.prebuild_flasher.cancel()
+        self.compile_pool.shutdown(wait=True, cancel_futures=True)
+        if self.worker and self.worker.isRunning():
+            # Don't restart the serial monitor on the way out
+            self.worker.finished_signal.disconnect(self.on_upload_finished)
+            self.worker.wait()
+        if self.deviceObserver:
+            self.deviceObserver.stop()
+        self.portScanner.wait()
         if self.serialMonitor._running:
             self.serialMonitor.stop()
             self.serialMonitor.wait()
@@ -18,9 +18,9 @@ from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
     QTransform)
 from PySide6.QtWidgets import (QApplication, QComboBox, QGridLayout, QGroupBox,
     QHBoxLayout, QLabel, QLineEdit, QMainWindow,
-    QMenu, QMenuBar, QPushButton, QSizePolicy,
-    QSpacerItem, QStatusBar, QTabWidget, QTextBrowser,
-    QVBoxLayout, QWidget)
+    QMenu, QMenuBar, QPlainTextEdit, QPushButton,
+    QSizePolicy, QSpacerItem, QStatusBar, QTabWidget,
+    QTextBrowser, QVBoxLayout, QWidget)
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
@@ -282,10 +282,17 @@ class Ui_MainWindow(object):
 
         self.verticalLayout_5.addWidget(self.label_2)
 
-        self.textBrowserLogOutput = QTextBrowser(self.groupBox_2)
-        self.textBrowserLogOutput.setObjectName(u"textBrowserLogOutput")
+        self.plainTextEditLogOutput = QPlainTextEdit(self.groupBox_2)
+        self.plainTextEditLogOutput.setObjectName(u"plainTextEditLogOutput")
+        self.plainTextEditLogOutput.setReadOnly(True)
 
-        self.verticalLayout_5.addWidget(self.textBrowserLogOutput)
+        self.verticalLayout_5.addWidget(self.plainTextEditLogOutput)
+
+        self.pushButtonCancelUpload = QPushButton(self.groupBox_2)
+        self.pushButtonCancelUpload.setObjectName(u"pushButtonCancelUpload")
+        self.pushButtonCancelUpload.setEnabled(False)
+
+        self.verticalLayout_5.addWidget(self.pushButtonCancelUpload)
 
 
         self.verticalLayout.addWidget(self.groupBox_2)
@@ -374,6 +381,7 @@ class Ui_MainWindow(object):
 
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tabWeight), QCoreApplication.translate("MainWindow", u"\ubb34\uac8c\uc13c\uc11c", None))
         self.label_2.setText(QCoreApplication.translate("MainWindow", u"\uc5c5\ub85c\ub4dc \uc9c4\ud589\uc0c1\ud669", None))
+        self.pushButtonCancelUpload.setText(QCoreApplication.translate("MainWindow", u"\uc5c5\ub85c\ub4dc \ucde8\uc18c", None))
         self.label_8.setText(QCoreApplication.translate("MainWindow", u"\uc2dc\ub9ac\uc5bc \ubaa8\ub2c8\ud130", None))
         self.menuFile.setTitle(QCoreApplication.translate("MainWindow", u"\ud30c\uc77c", None))
     # retranslateUi